@@ -1,5 +1,6 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash
 from functools import wraps
+import click
 from datetime import datetime, UTC
 import os
 
@@ -10,8 +11,15 @@ app.secret_key = os.environ.get('SECRET_KEY', 'votre_cle_secrete_a_changer_en_pr
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///exam_website.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Recalcul des notes depuis l'interface : nombre de lots traités par requête
+# et de processus de calcul, pour rester sous le délai d'une requête HTTP
+app.config['REGRADE_CHUNKS_PER_REQUEST'] = 4
+app.config['REGRADE_WORKERS'] = 2
+
 # Importer les modèles et initialiser la DB
 from models import db, User, Role, QCM, Question, Answer, UserAttempt, UserAnswer
+from search import init_search_index, search_questions
+from regrade import ensure_regrade_indexes, get_resume_point, load_answer_key, grade_attempt, regrade_qcm
 
 db.init_app(app)
 
@@ -22,6 +30,12 @@ def initialize_database():
         # Créer toutes les tables
         db.create_all()
 
+        # Créer l'index de recherche plein texte sur les questions et réponses
+        init_search_index()
+
+        # Créer les index utilisés par le recalcul des notes sur une base existante
+        ensure_regrade_indexes()
+
         # Vérifier si les rôles existent déjà
         if Role.query.count() == 0:
             # Créer les rôles
@@ -284,6 +298,41 @@ def liste_qcm_admin():
     qcms = QCM.query.order_by(QCM.created_at.desc()).all()
     return render_template('qcm/liste_qcm_admin.html', user=user, qcms=qcms)
 
+@app.route('/api/questions/recherche')
+@admin_required
+def rechercher_questions():
+    """API de recherche plein texte dans la banque de questions"""
+    terms = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+
+    if not terms:
+        return {'success': False, 'message': 'Veuillez saisir un terme de recherche'}, 400
+
+    questions, total = search_questions(terms, page=page, per_page=per_page)
+
+    results = []
+    for question in questions:
+        results.append({
+            'id': question.id,
+            'text': question.question_text,
+            'qcm_id': question.qcm_id,
+            'qcm_title': question.qcm.title,
+            'answers': [
+                {'text': answer.answer_text, 'is_correct': answer.is_correct}
+                for answer in sorted(question.answers, key=lambda a: a.order)
+            ]
+        })
+
+    return {
+        'success': True,
+        'results': results,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page
+    }
+
 @app.route('/qcm')
 @login_required
 def liste_qcm():
@@ -335,17 +384,16 @@ def soumettre_qcm(qcm_id):
     db.session.add(attempt)
     db.session.flush()
 
-    # Enregistrer les réponses et calculer le score par question
-    total_questions = len(qcm.questions)
-    total_score = 0
+    # Enregistrer les réponses sélectionnées pour chaque question
+    selections = {}
 
     for question in qcm.questions:
         # Récupérer toutes les réponses sélectionnées pour cette question
-        selected_answer_ids = request.form.getlist(f'question_{question.id}')
+        selected_answer_ids = [int(answer_id) for answer_id in request.form.getlist(f'question_{question.id}')]
+        selections[question.id] = set(selected_answer_ids)
 
         # Enregistrer chaque réponse sélectionnée
         for answer_id in selected_answer_ids:
-            answer_id = int(answer_id)
             user_answer = UserAnswer(
                 attempt_id=attempt.id,
                 question_id=question.id,
@@ -353,119 +401,13 @@ def soumettre_qcm(qcm_id):
             )
             db.session.add(user_answer)
 
-        # Calculer le score pour cette question
-        question_score = calculate_question_score(question, selected_answer_ids)
-        total_score += question_score
-
-    # Calculer le score en pourcentage
-    score = (total_score / total_questions * 100) if total_questions > 0 else 0
-    attempt.score = score
+    # Calculer le score en pourcentage, avec le même calcul que le recalcul des notes
+    attempt.score = grade_attempt(load_answer_key(qcm.id), selections)
 
     db.session.commit()
 
     return redirect(url_for('resultat_qcm', attempt_id=attempt.id))
 
-def calculate_question_score(question, selected_answer_ids):
-    """
-    Calcule le score pour une question avec pénalités
-    Format: Bonnes cochées / Mauvaises cochées / Score
-
-    Le score dépend du nombre de bonnes réponses dans la question,
-    du nombre de bonnes réponses cochées, et du nombre de mauvaises réponses cochées
-    """
-    selected_ids = set(int(aid) for aid in selected_answer_ids) if selected_answer_ids else set()
-
-    # Récupérer les réponses correctes et incorrectes
-    correct_answer_ids = set(answer.id for answer in question.answers if answer.is_correct)
-    incorrect_answer_ids = set(answer.id for answer in question.answers if not answer.is_correct)
-
-    # Calculer le nombre de bonnes et mauvaises réponses cochées
-    correct_checked = len(selected_ids & correct_answer_ids)  # Intersection
-    incorrect_checked = len(selected_ids & incorrect_answer_ids)  # Intersection
-
-    # Nombre total de bonnes réponses dans la question
-    total_correct = len(correct_answer_ids)
-
-    # Tables de notation selon le nombre de bonnes réponses
-    scoring_tables = {
-        1: {  # Si une bonne réponse est la bonne
-            (1, 0): 1.0,
-            (1, 1): 0.5,
-            (1, 2): 0.0,
-        },
-        2: {  # Si deux bonnes réponses sont les bonnes
-            (2, 0): 1.0,
-            (2, 1): 0.66,
-            (2, 2): 0.5,
-            (2, 3): 0.4,
-            (1, 0): 0.5,
-            (1, 1): 0.25,
-            (1, 2): 0.0,
-        },
-        3: {  # Si trois bonnes réponses sont les bonnes
-            (3, 0): 1.0,
-            (3, 1): 0.66,
-            (3, 2): 0.33,
-            (2, 0): 0.66,
-            (2, 1): 0.33,
-            (2, 2): 0.0,
-            (1, 0): 0.33,
-            (1, 1): 0.0,
-        },
-        4: {  # Si quatre bonnes réponses sont les bonnes
-            (4, 0): 1.0,
-            (4, 1): 0.75,
-            (3, 0): 0.75,
-            (3, 1): 0.5,
-            (2, 0): 0.5,
-            (2, 1): 0.25,
-            (1, 0): 0.2,
-            (1, 1): 0.0,
-        },
-        5: {  # Si cinq bonnes réponses sont les bonnes
-            (5, 0): 1.0,
-            (4, 0): 0.8,
-            (3, 0): 0.6,
-            (2, 0): 0.4,
-            (1, 0): 0.2,
-            (0, 0): 0.0,
-        }
-    }
-
-    # Récupérer la table de notation appropriée
-    if total_correct not in scoring_tables:
-        # Cas imprévu, retour au système strict
-        return 1.0 if (correct_checked == total_correct and incorrect_checked == 0) else 0.0
-
-    scoring_table = scoring_tables[total_correct]
-
-    # Chercher le score correspondant
-    # Pour les cas avec "2 ou +" ou "1 ou +", on vérifie les conditions
-    key = (correct_checked, incorrect_checked)
-
-    if key in scoring_table:
-        return scoring_table[key]
-
-    # Gérer les cas "2 ou +" et "1 ou +"
-    if total_correct == 1:
-        if correct_checked == 1 and incorrect_checked >= 2:
-            return 0.0
-    elif total_correct == 2:
-        if correct_checked == 1 and incorrect_checked >= 2:
-            return 0.0
-    elif total_correct == 3:
-        if correct_checked == 2 and incorrect_checked >= 2:
-            return 0.0
-        if correct_checked == 1 and incorrect_checked >= 1:
-            return 0.0
-    elif total_correct == 5:
-        # Pour 5 bonnes réponses, si on coche des mauvaises, score = 0
-        if incorrect_checked > 0:
-            return 0.0
-
-    # Par défaut, si combinaison non prévue, score = 0
-    return 0.0
-
 @app.route('/resultat/<int:attempt_id>')
 @login_required
 def resultat_qcm(attempt_id):
@@ -501,5 +443,92 @@ def delete_qcm(qcm_id):
 
     return {'success': True, 'message': 'QCM supprimé avec succès'}
 
+@app.route('/api/qcm/<int:qcm_id>/recalculer-notes', methods=['POST'])
+@admin_required
+def recalculer_notes_qcm(qcm_id):
+    """
+    API pour recalculer les notes d'un QCM, quelques lots à la fois
+    ?simulation=1 : aperçu des différences sur les premiers lots, sans rien modifier
+    ?reprendre=1 : poursuit après la dernière tentative traitée
+    L'interface rappelle l'API tant que 'done' est faux
+    """
+    qcm = QCM.query.get_or_404(qcm_id)
+    dry_run = request.args.get('simulation', '0') == '1'
+    resume = request.args.get('reprendre', '0') == '1'
+
+    # Aperçu des différences affiché avant confirmation (limité aux premières notes modifiées)
+    changes = []
+
+    def collect_change(attempt_id, user_id, old_score, new_score):
+        if len(changes) < 10:
+            changes.append({'attempt_id': attempt_id, 'user_id': user_id,
+                            'old_score': old_score, 'new_score': new_score})
+
+    # Point de reprise d'un recalcul interrompu (0 s'il n'existe pas ou si le corrigé a changé)
+    checkpoint = get_resume_point(qcm.id)
+
+    summary = regrade_qcm(
+        qcm.id,
+        dry_run=dry_run,
+        resume=resume and not dry_run,
+        workers=app.config['REGRADE_WORKERS'],
+        max_chunks=app.config['REGRADE_CHUNKS_PER_REQUEST'],
+        on_change=collect_change
+    )
+
+    # Progression globale : tentatives déjà traitées sur l'ensemble du QCM
+    attempts_total = UserAttempt.query.filter_by(qcm_id=qcm.id).count()
+    attempts_done = UserAttempt.query.filter(
+        UserAttempt.qcm_id == qcm.id, UserAttempt.id <= summary['last_attempt_id']
+    ).count()
+
+    if dry_run:
+        scope = 'toutes les' if summary['done'] else f"les {summary['processed']} premières sur"
+        message = f"Aperçu sur {scope} {attempts_total} tentative(s) : {summary['changed']} note(s) seraient modifiées"
+    else:
+        message = f"{attempts_done}/{attempts_total} tentatives traitées"
+
+    return {'success': True, 'message': message, 'changes': changes, 'checkpoint': checkpoint,
+            'attempts_done': attempts_done, 'attempts_total': attempts_total, **summary}
+
+@app.cli.command('recalculer-notes')
+@click.argument('qcm_id', type=int)
+@click.option('--simulation', is_flag=True, help='Affiche les différences sans modifier les notes')
+@click.option('--reprendre', is_flag=True, help='Reprend après la dernière tentative traitée')
+@click.option('--taille-lot', default=500, show_default=True, type=click.IntRange(min=1),
+              help='Nombre de tentatives par lot')
+@click.option('--processus', default=None, type=click.IntRange(min=0),
+              help='Nombre de processus de calcul (0 = sans pool)')
+def recalculer_notes(qcm_id, simulation, reprendre, taille_lot, processus):
+    """Recalcule les notes de toutes les tentatives d'un QCM"""
+    qcm = db.session.get(QCM, qcm_id)
+    if not qcm:
+        raise click.ClickException(f'QCM {qcm_id} introuvable')
+
+    # Annoncer la reprise avant les lignes de progression
+    resume_point = get_resume_point(qcm.id) if reprendre else 0
+    if resume_point:
+        click.echo(f'Reprise après la tentative {resume_point}')
+
+    def show_progress(processed, total, changed):
+        click.echo(f'{processed}/{total} tentatives traitées, {changed} note(s) modifiée(s)')
+
+    def show_change(attempt_id, user_id, old_score, new_score):
+        old = '-' if old_score is None else f'{old_score:.2f}'
+        click.echo(f'  tentative {attempt_id} (utilisateur {user_id}) : {old} -> {new_score:.2f}')
+
+    summary = regrade_qcm(
+        qcm.id,
+        dry_run=simulation,
+        resume=reprendre,
+        chunk_size=taille_lot,
+        workers=processus,
+        on_progress=show_progress,
+        on_change=show_change if simulation else None
+    )
+
+    verb = 'seraient modifiées' if simulation else 'modifiées'
+    click.echo(f"QCM « {qcm.title} » : {summary['changed']} note(s) sur {summary['processed']} {verb}")
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
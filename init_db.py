@@ -1,5 +1,7 @@
 from models import db, Role, User, QCM, Question, Answer, UserAttempt, UserAnswer
 from app import app
+from search import init_search_index
+from regrade import ensure_regrade_indexes
 
 def init_database():
     """Initialise la base de données avec les rôles et l'admin par défaut"""
@@ -7,6 +9,12 @@ def init_database():
         # Créer toutes les tables
         db.create_all()
 
+        # Créer l'index de recherche plein texte sur les questions et réponses
+        init_search_index()
+
+        # Créer les index utilisés par le recalcul des notes sur une base existante
+        ensure_regrade_indexes()
+
         # Vérifier si les rôles existent déjà
         if Role.query.count() == 0:
             # Créer les rôles
@@ -35,6 +35,7 @@ class QCM(db.Model):
     creator = db.relationship('User', backref='qcms_created')
     questions = db.relationship('Question', backref='qcm', lazy=True, cascade='all, delete-orphan')
     user_attempts = db.relationship('UserAttempt', backref='qcm', lazy=True, cascade='all, delete-orphan')
+    regrade_checkpoint = db.relationship('RegradeCheckpoint', backref='qcm', uselist=False, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<QCM {self.title}>'
@@ -78,7 +79,7 @@ class UserAttempt(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    qcm_id = db.Column(db.Integer, db.ForeignKey('qcm.id'), nullable=False)
+    qcm_id = db.Column(db.Integer, db.ForeignKey('qcm.id'), nullable=False, index=True)
     score = db.Column(db.Float)
     completed_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -95,7 +96,7 @@ class UserAnswer(db.Model):
     __tablename__ = 'user_answer'
 
     id = db.Column(db.Integer, primary_key=True)
-    attempt_id = db.Column(db.Integer, db.ForeignKey('user_attempt.id'), nullable=False)
+    attempt_id = db.Column(db.Integer, db.ForeignKey('user_attempt.id'), nullable=False, index=True)
     question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
     answer_id = db.Column(db.Integer, db.ForeignKey('answer.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -108,6 +109,20 @@ class UserAnswer(db.Model):
         return f'<UserAnswer {self.id}: Attempt {self.attempt_id}>'
 
 
+class RegradeCheckpoint(db.Model):
+    """Table des points de reprise du recalcul des notes"""
+    __tablename__ = 'regrade_checkpoint'
+
+    qcm_id = db.Column(db.Integer, db.ForeignKey('qcm.id'), primary_key=True)
+    last_attempt_id = db.Column(db.Integer, nullable=False)
+    # Empreinte du corrigé et du barème utilisés : le point de reprise n'est valable que pour eux
+    answer_key_hash = db.Column(db.String(64), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<RegradeCheckpoint QCM {self.qcm_id}: tentative {self.last_attempt_id}>'
+
+
 class User(db.Model):
     """Table des utilisateurs"""
     __tablename__ = 'user'
@@ -0,0 +1,229 @@
+"""
+Recalcul en masse des notes d'un QCM
+Utilisé après la correction d'une bonne réponse ou un changement des tables de notation
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import os
+
+from sqlalchemy import func, update
+
+from models import db, Question, Answer, UserAttempt, UserAnswer, RegradeCheckpoint
+from scoring import answer_key_fingerprint, score_selection
+
+# Écart en dessous duquel une note est considérée comme inchangée
+SCORE_TOLERANCE = 1e-9
+
+# Corrigé du QCM, chargé une seule fois dans chaque processus de calcul
+_answer_key = None
+
+
+def ensure_regrade_indexes():
+    """Crée les index utilisés par le recalcul sur une base existante"""
+    for table in (UserAttempt.__table__, UserAnswer.__table__):
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+def load_answer_key(qcm_id):
+    """
+    Charge le corrigé d'un QCM
+    Retourne {question_id: (ids des bonnes réponses, ids des mauvaises réponses)}
+    """
+    answer_key = {
+        question_id: (set(), set())
+        for (question_id,) in db.session.query(Question.id).filter(Question.qcm_id == qcm_id).order_by(Question.id)
+    }
+
+    rows = db.session.query(Answer.id, Answer.question_id, Answer.is_correct) \
+        .join(Question, Answer.question_id == Question.id) \
+        .filter(Question.qcm_id == qcm_id)
+
+    for answer_id, question_id, is_correct in rows:
+        correct_ids, incorrect_ids = answer_key[question_id]
+        (correct_ids if is_correct else incorrect_ids).add(answer_id)
+
+    return {
+        question_id: (frozenset(correct_ids), frozenset(incorrect_ids))
+        for question_id, (correct_ids, incorrect_ids) in answer_key.items()
+    }
+
+
+def grade_attempt(answer_key, selections):
+    """
+    Calcule le score en pourcentage d'une tentative à partir des réponses cochées par question
+    Utilisé à la soumission d'un QCM comme lors du recalcul des notes
+    """
+    if not answer_key:
+        return 0
+
+    total_score = 0
+    for question_id, (correct_ids, incorrect_ids) in answer_key.items():
+        total_score += score_selection(correct_ids, incorrect_ids, selections.get(question_id, set()))
+
+    return total_score / len(answer_key) * 100
+
+
+def _init_worker(answer_key):
+    """Initialise un processus de calcul avec le corrigé du QCM"""
+    global _answer_key
+    _answer_key = answer_key
+
+
+def _grade_chunk(chunk):
+    """Recalcule les scores d'un lot de tentatives (exécuté dans un processus de calcul)"""
+    return [
+        (attempt_id, user_id, old_score, grade_attempt(_answer_key, selections))
+        for attempt_id, user_id, old_score, selections in chunk
+    ]
+
+
+def iter_attempt_chunks(qcm_id, after_id=0, until_id=None, chunk_size=500):
+    """
+    Parcourt les tentatives d'un QCM par lots, dans l'ordre des identifiants
+    Seules les tentatives dont l'identifiant est dans ]after_id, until_id] sont parcourues.
+    Chaque lot est une liste de (attempt_id, user_id, ancien score, {question_id: ids cochés})
+    """
+    last_id = after_id
+    while True:
+        query = db.session.query(UserAttempt.id, UserAttempt.user_id, UserAttempt.score) \
+            .filter(UserAttempt.qcm_id == qcm_id, UserAttempt.id > last_id)
+        if until_id is not None:
+            query = query.filter(UserAttempt.id <= until_id)
+        attempts = query.order_by(UserAttempt.id).limit(chunk_size).all()
+
+        if not attempts:
+            return
+
+        first_id, last_id = attempts[0].id, attempts[-1].id
+
+        # Une seule requête par lot pour toutes les réponses cochées des tentatives
+        selections = {attempt.id: {} for attempt in attempts}
+        rows = db.session.query(UserAnswer.attempt_id, UserAnswer.question_id, UserAnswer.answer_id) \
+            .join(UserAttempt, UserAnswer.attempt_id == UserAttempt.id) \
+            .filter(UserAttempt.qcm_id == qcm_id, UserAnswer.attempt_id.between(first_id, last_id))
+
+        for attempt_id, question_id, answer_id in rows:
+            selections[attempt_id].setdefault(question_id, set()).add(answer_id)
+
+        yield [
+            (attempt.id, attempt.user_id, attempt.score, selections[attempt.id])
+            for attempt in attempts
+        ]
+
+
+def get_resume_point(qcm_id, answer_key=None):
+    """
+    Retourne l'identifiant de la dernière tentative traitée par un recalcul interrompu (0 sinon)
+    Un point de reprise calculé avec un autre corrigé ou un autre barème est ignoré :
+    les tentatives déjà traitées auraient des notes périmées
+    """
+    checkpoint = db.session.get(RegradeCheckpoint, qcm_id)
+    if not checkpoint:
+        return 0
+
+    if answer_key is None:
+        answer_key = load_answer_key(qcm_id)
+    if checkpoint.answer_key_hash != answer_key_fingerprint(answer_key):
+        return 0
+
+    return checkpoint.last_attempt_id
+
+
+def regrade_qcm(qcm_id, dry_run=False, resume=False, chunk_size=500, workers=None, max_chunks=None,
+                on_progress=None, on_change=None):
+    """
+    Recalcule les notes des tentatives d'un QCM
+
+    Les lots sont notés en parallèle dans un pool de processus, puis les notes modifiées
+    sont écrites par lot avec un point de reprise dans la même transaction.
+    En simulation (dry_run), rien n'est écrit : on_change reçoit seulement les différences.
+
+    Avec resume=True, le recalcul reprend au point de reprise s'il a été calculé avec
+    le même corrigé et le même barème, sinon il repart de la première tentative.
+    Seules les tentatives existant au démarrage sont parcourues : celles soumises pendant
+    le recalcul sont déjà notées avec le corrigé courant.
+    Avec max_chunks, au plus ce nombre de lots est traité ; le recalcul se poursuit
+    ensuite avec resume=True (summary['done'] indique s'il reste des tentatives).
+
+    on_progress(traitées, total, modifiées) est appelé après chaque lot,
+    on_change(attempt_id, user_id, ancien score, nouveau score) pour chaque note modifiée.
+    Retourne un résumé du recalcul.
+    """
+    answer_key = load_answer_key(qcm_id)
+    fingerprint = answer_key_fingerprint(answer_key)
+
+    after_id = get_resume_point(qcm_id, answer_key) if resume else 0
+    until_id = db.session.query(func.max(UserAttempt.id)).filter(UserAttempt.qcm_id == qcm_id).scalar() or 0
+
+    total = UserAttempt.query.filter(
+        UserAttempt.qcm_id == qcm_id, UserAttempt.id > after_id, UserAttempt.id <= until_id
+    ).count()
+    summary = {'qcm_id': qcm_id, 'total': total, 'processed': 0, 'changed': 0,
+               'resumed_after': after_id, 'last_attempt_id': after_id, 'done': False, 'dry_run': dry_run}
+
+    def apply_results(last_attempt_id, results):
+        changes = []
+        for attempt_id, user_id, old_score, new_score in results:
+            if old_score is None or abs(new_score - old_score) > SCORE_TOLERANCE:
+                changes.append({'id': attempt_id, 'score': new_score})
+                if on_change:
+                    on_change(attempt_id, user_id, old_score, new_score)
+
+        if not dry_run:
+            if changes:
+                db.session.execute(update(UserAttempt), changes)
+
+            # Un point de reprise périmé (autre corrigé) est remplacé par celui de ce recalcul
+            current = db.session.get(RegradeCheckpoint, qcm_id)
+            if current:
+                current.last_attempt_id = last_attempt_id
+                current.answer_key_hash = fingerprint
+            else:
+                db.session.add(RegradeCheckpoint(qcm_id=qcm_id, last_attempt_id=last_attempt_id,
+                                                 answer_key_hash=fingerprint))
+            db.session.commit()
+
+        summary['processed'] += len(results)
+        summary['changed'] += len(changes)
+        summary['last_attempt_id'] = last_attempt_id
+        if on_progress:
+            on_progress(summary['processed'], total, summary['changed'])
+
+    chunks = islice(
+        iter_attempt_chunks(qcm_id, after_id=after_id, until_id=until_id, chunk_size=chunk_size),
+        max_chunks
+    )
+
+    if workers == 0:
+        # Calcul dans le processus courant (petits QCM, débogage)
+        _init_worker(answer_key)
+        for chunk in chunks:
+            apply_results(chunk[-1][0], _grade_chunk(chunk))
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(answer_key,)) as pool:
+            # Nombre limité de lots en vol pour borner la mémoire ;
+            # les résultats sont appliqués dans l'ordre pour que le point de reprise reste exact
+            pending = deque()
+            for chunk in chunks:
+                pending.append((chunk[-1][0], pool.submit(_grade_chunk, chunk)))
+                if len(pending) >= workers * 2:
+                    last_attempt_id, future = pending.popleft()
+                    apply_results(last_attempt_id, future.result())
+
+            while pending:
+                last_attempt_id, future = pending.popleft()
+                apply_results(last_attempt_id, future.result())
+
+    summary['done'] = summary['last_attempt_id'] >= until_id
+
+    # Recalcul terminé : le point de reprise n'est plus utile
+    if summary['done'] and not dry_run:
+        checkpoint = db.session.get(RegradeCheckpoint, qcm_id)
+        if checkpoint:
+            db.session.delete(checkpoint)
+            db.session.commit()
+
+    return summary
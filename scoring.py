@@ -0,0 +1,112 @@
+"""
+Calcul des scores des QCM
+Module sans dépendance à Flask, utilisable depuis les processus de recalcul des notes
+"""
+import hashlib
+
+# Tables de notation selon le nombre de bonnes réponses
+# Clé : (bonnes réponses cochées, mauvaises réponses cochées) -> score de la question
+SCORING_TABLES = {
+    1: {  # Si une bonne réponse est la bonne
+        (1, 0): 1.0,
+        (1, 1): 0.5,
+        (1, 2): 0.0,
+    },
+    2: {  # Si deux bonnes réponses sont les bonnes
+        (2, 0): 1.0,
+        (2, 1): 0.66,
+        (2, 2): 0.5,
+        (2, 3): 0.4,
+        (1, 0): 0.5,
+        (1, 1): 0.25,
+        (1, 2): 0.0,
+    },
+    3: {  # Si trois bonnes réponses sont les bonnes
+        (3, 0): 1.0,
+        (3, 1): 0.66,
+        (3, 2): 0.33,
+        (2, 0): 0.66,
+        (2, 1): 0.33,
+        (2, 2): 0.0,
+        (1, 0): 0.33,
+        (1, 1): 0.0,
+    },
+    4: {  # Si quatre bonnes réponses sont les bonnes
+        (4, 0): 1.0,
+        (4, 1): 0.75,
+        (3, 0): 0.75,
+        (3, 1): 0.5,
+        (2, 0): 0.5,
+        (2, 1): 0.25,
+        (1, 0): 0.2,
+        (1, 1): 0.0,
+    },
+    5: {  # Si cinq bonnes réponses sont les bonnes
+        (5, 0): 1.0,
+        (4, 0): 0.8,
+        (3, 0): 0.6,
+        (2, 0): 0.4,
+        (1, 0): 0.2,
+        (0, 0): 0.0,
+    }
+}
+
+
+def answer_key_fingerprint(answer_key):
+    """
+    Empreinte du corrigé d'un QCM et des tables de notation
+    Change dès qu'une bonne réponse ou un barème est modifié
+    """
+    key = sorted(
+        (question_id, sorted(correct_ids), sorted(incorrect_ids))
+        for question_id, (correct_ids, incorrect_ids) in answer_key.items()
+    )
+    tables = sorted((total, sorted(table.items())) for total, table in SCORING_TABLES.items())
+    return hashlib.sha256(repr((key, tables)).encode()).hexdigest()
+
+
+def score_selection(correct_answer_ids, incorrect_answer_ids, selected_ids):
+    """
+    Calcule le score d'une question à partir des identifiants de réponses
+    (bonnes, mauvaises et cochées), sans accès à la base de données
+    """
+    # Calculer le nombre de bonnes et mauvaises réponses cochées
+    correct_checked = len(selected_ids & correct_answer_ids)  # Intersection
+    incorrect_checked = len(selected_ids & incorrect_answer_ids)  # Intersection
+
+    # Nombre total de bonnes réponses dans la question
+    total_correct = len(correct_answer_ids)
+
+    # Récupérer la table de notation appropriée
+    if total_correct not in SCORING_TABLES:
+        # Cas imprévu, retour au système strict
+        return 1.0 if (correct_checked == total_correct and incorrect_checked == 0) else 0.0
+
+    scoring_table = SCORING_TABLES[total_correct]
+
+    # Chercher le score correspondant
+    # Pour les cas avec "2 ou +" ou "1 ou +", on vérifie les conditions
+    key = (correct_checked, incorrect_checked)
+
+    if key in scoring_table:
+        return scoring_table[key]
+
+    # Gérer les cas "2 ou +" et "1 ou +"
+    if total_correct == 1:
+        if correct_checked == 1 and incorrect_checked >= 2:
+            return 0.0
+    elif total_correct == 2:
+        if correct_checked == 1 and incorrect_checked >= 2:
+            return 0.0
+    elif total_correct == 3:
+        if correct_checked == 2 and incorrect_checked >= 2:
+            return 0.0
+        if correct_checked == 1 and incorrect_checked >= 1:
+            return 0.0
+    elif total_correct == 5:
+        # Pour 5 bonnes réponses, si on coche des mauvaises, score = 0
+        if incorrect_checked > 0:
+            return 0.0
+
+    # Par défaut, si combinaison non prévue, score = 0
+    return 0.0
@@ -0,0 +1,123 @@
+"""
+Index de recherche plein texte (SQLite FTS5) sur la banque de questions
+Les tables virtuelles sont synchronisées avec les tables question et answer par des triggers
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import db, Question
+
+# Tables FTS5 à contenu externe : seul l'index est stocké, le texte reste dans question/answer
+FTS_TABLES = {
+    'question_fts': ('question', 'question_text'),
+    'answer_fts': ('answer', 'answer_text'),
+}
+
+
+def _index_statements(fts_table, source_table, column):
+    """Retourne les requêtes de création de la table FTS5 et de ses triggers"""
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+            {column},
+            content='{source_table}',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {source_table} BEGIN
+            INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {source_table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {column} ON {source_table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+            INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column});
+        END""",
+    ]
+
+
+def init_search_index():
+    """Crée l'index FTS5 et ses triggers, puis l'alimente avec les données existantes si besoin"""
+    if db.engine.dialect.name != 'sqlite':
+        return
+
+    for fts_table, (source_table, column) in FTS_TABLES.items():
+        exists = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': fts_table}
+        ).first()
+
+        for statement in _index_statements(fts_table, source_table, column):
+            db.session.execute(text(statement))
+
+        # Première création : indexer les questions et réponses déjà présentes
+        if not exists:
+            db.session.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+    db.session.commit()
+
+
+def build_match_query(terms):
+    """
+    Transforme la saisie de l'utilisateur en requête FTS5 sûre
+    Chaque mot est échappé et recherché en préfixe (ex: "muscu" trouve "musculaire")
+    """
+    tokens = [token.replace('"', '""') for token in terms.split()]
+    return ' '.join(f'"{token}"*' for token in tokens if token)
+
+
+def search_questions(terms, page=1, per_page=20):
+    """
+    Recherche les questions dont le texte ou l'une des réponses correspond aux termes
+    Retourne (questions triées par pertinence, nombre total de résultats)
+    """
+    match = build_match_query(terms)
+    if not match:
+        return [], 0
+
+    # Le score bm25 est calculé par table (statistiques propres à question_fts et answer_fts),
+    # les deux ne sont donc pas comparables : les questions dont le texte correspond
+    # passent en premier (source 0), classées par leur bm25, puis celles qui ne correspondent
+    # que par une réponse (source 1), classées par le meilleur bm25 de leurs réponses
+    hits = """
+        WITH hits AS (
+            SELECT rowid AS question_id, 0 AS source, bm25(question_fts) AS rank
+            FROM question_fts
+            WHERE question_fts MATCH :match
+            UNION ALL
+            SELECT answer.question_id, 1 AS source, bm25(answer_fts) AS rank
+            FROM answer_fts
+            JOIN answer ON answer.id = answer_fts.rowid
+            WHERE answer_fts MATCH :match
+        )
+    """
+
+    total = db.session.execute(
+        text(hits + "SELECT COUNT(DISTINCT question_id) FROM hits"),
+        {'match': match}
+    ).scalar()
+
+    rows = db.session.execute(
+        text(hits + """
+            SELECT question_id
+            FROM hits
+            GROUP BY question_id
+            ORDER BY MIN(source),
+                     COALESCE(MIN(CASE WHEN source = 0 THEN rank END), MIN(rank)),
+                     question_id
+            LIMIT :limit OFFSET :offset
+        """),
+        {'match': match, 'limit': per_page, 'offset': (page - 1) * per_page}
+    ).all()
+
+    question_ids = [row.question_id for row in rows]
+    if not question_ids:
+        return [], total
+
+    # Charger les questions de la page (avec QCM et réponses) en conservant l'ordre de pertinence
+    questions = {
+        q.id: q
+        for q in Question.query.options(selectinload(Question.answers), joinedload(Question.qcm))
+        .filter(Question.id.in_(question_ids)).all()
+    }
+    return [questions[qid] for qid in question_ids if qid in questions], total